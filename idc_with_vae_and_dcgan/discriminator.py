@@ -29,9 +29,8 @@ class Discriminator(nn.Module):
             nn.BatchNorm2d(self.dis_feature_map_size * 8),
             nn.LeakyReLU(0.2, inplace=True),
 
-            # (dis_feature_map_size*8) * 4 * 4 --> discriminator_prediction_output
-            nn.Conv2d(self.dis_feature_map_size * 8, 1, 4, 1, 0, bias=False),
-            nn.Sigmoid()
+            # (dis_feature_map_size*8) * 4 * 4 --> discriminator_prediction_output (logits)
+            nn.Conv2d(self.dis_feature_map_size * 8, 1, 4, 1, 0, bias=False)
         )
 
     def forward(self, image):
@@ -2,13 +2,14 @@ import os
 import glob
 import random
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import torch.nn as nn
 import torch.nn.parallel
+import torch.backends.cudnn as cudnn
 import torch.optim as optim
-import torchvision.utils
 from torch.utils.data import DataLoader, Dataset, random_split
-import torchvision.transforms as transforms
+from torch.cuda.amp import autocast, GradScaler
 import torchvision.utils as vutils
 import numpy as np
 import matplotlib.pyplot as plt
@@ -23,32 +24,130 @@ os.environ['KMP_DUPLICATE_LIB_OK']='True'
 
 
 class CustomImageDataset(Dataset):
-    def __init__(self, path, pattern, transform=None):
-        self.file_list = glob.glob(os.path.join(path, pattern))
+    # fields read from every npz sample
+    fields = ("delta_vmap", "dI", "dmap", "nmap")
+    # folder (inside the dataset path) holding one memory-mapped .npy file per field
+    cache_folder = "cache"
+    # manifest files recording which samples (and which version of them) the cache was built from
+    manifest = ("files", "file_stats")
+
+    def __init__(self, path, pattern, transform=None, use_cache=True):
+        # sorted so that random_split gives the same split for the same seed, stored as one fixed-width bytes
+        # array instead of a list of python strings that every dataloader worker would hold its own copy of
+        self.file_list = np.array([os.fsencode(f_path) for f_path in sorted(glob.glob(os.path.join(path, pattern)))],
+                                  dtype=np.bytes_)
         self.transform = transform
+        self.cache_dir = os.path.join(path, self.cache_folder)
+        self.use_cache = use_cache and self.cache_is_valid()
+        # memmaps are opened lazily by whichever process reads the samples (see __getstate__)
+        self.cache = None
 
     def __len__(self):
         return len(self.file_list)
 
+    def __getstate__(self):
+        # a pickled memmap is written out as a full in-memory array, so spawned dataloader workers get the dataset
+        # without it and open their own memmaps on first read
+        state = self.__dict__.copy()
+        state["cache"] = None
+        return state
+
+    def file_stats(self):
+        """
+        Size and modification time of every sample file
+        :return:
+        (np.ndarray) int64 array [N x 2] of (st_size, st_mtime_ns)
+        """
+        stats = [os.stat(os.fsdecode(f_path)) for f_path in self.file_list]
+        return np.array([(stat.st_size, stat.st_mtime_ns) for stat in stats], dtype=np.int64).reshape(-1, 2)
+
+    def cache_is_valid(self):
+        """
+        Checks that the cache exists and was built from exactly the current file list, in the same order and from
+        unchanged files
+        :return:
+        (bool) True if the cached fields can be used in place of the npz samples
+        """
+        names = self.fields + self.manifest
+        if not all(os.path.exists(os.path.join(self.cache_dir, f"{name}.npy")) for name in names):
+            return False
+        files = np.load(os.path.join(self.cache_dir, "files.npy"))
+        file_stats = np.load(os.path.join(self.cache_dir, "file_stats.npy"))
+        return np.array_equal(files, self.file_list) and np.array_equal(file_stats, self.file_stats())
+
+    def open_cache(self):
+        """
+        Memory maps the per-field cache files written by prepare_cache
+        :return:
+        dict of read-only memmaps keyed by field
+        """
+        return {field: np.load(os.path.join(self.cache_dir, f"{field}.npy"), mmap_mode="r") for field in self.fields}
+
+    @classmethod
+    def prepare_cache(cls, path, pattern):
+        """
+        Decompresses every npz sample once and stacks each field into a float32 .npy file, so that samples can
+        later be sliced out of a memmap instead of unzipping an archive per item
+        :param path: (str) dataset folder
+        :param pattern: (str) glob pattern of the npz samples
+        :return:
+        None
+        """
+        dataset = cls(path, pattern)
+        if dataset.use_cache or len(dataset.file_list) == 0:
+            return
+        os.makedirs(dataset.cache_dir, exist_ok=True)
+        # invalidate any previous cache before its field files start being replaced
+        for name in cls.manifest:
+            if os.path.exists(os.path.join(dataset.cache_dir, f"{name}.npy")):
+                os.remove(os.path.join(dataset.cache_dir, f"{name}.npy"))
+        cache = {}
+        for idx, f_path in enumerate(dataset.file_list):
+            with np.load(os.fsdecode(f_path)) as data:
+                for field in cls.fields:
+                    if field not in cache:
+                        cache[field] = np.lib.format.open_memmap(
+                            os.path.join(dataset.cache_dir, f"{field}.tmp.npy"), mode="w+", dtype=np.float32,
+                            shape=(len(dataset.file_list),) + data[field].shape)
+                    cache[field][idx] = data[field]
+        # only expose the cache once it is fully written, so an interrupted run is not mistaken for a valid one
+        for field in cls.fields:
+            cache[field].flush()
+            del cache[field]
+            os.replace(os.path.join(dataset.cache_dir, f"{field}.tmp.npy"),
+                       os.path.join(dataset.cache_dir, f"{field}.npy"))
+        # the manifest goes last, its presence marks the cache as complete
+        for name, values in zip(cls.manifest, (dataset.file_list, dataset.file_stats())):
+            np.save(os.path.join(dataset.cache_dir, f"{name}.tmp.npy"), values)
+            os.replace(os.path.join(dataset.cache_dir, f"{name}.tmp.npy"),
+                       os.path.join(dataset.cache_dir, f"{name}.npy"))
+
+    def read_fields(self, idx):
+        if self.use_cache:
+            if self.cache is None:
+                self.cache = self.open_cache()
+            # copy the slice out of the read-only memmap so torch gets a writable array
+            return {field: np.array(self.cache[field][idx], dtype=np.float32) for field in self.fields}
+        with np.load(os.fsdecode(self.file_list[idx])) as data:
+            return {field: np.ascontiguousarray(data[field], dtype=np.float32) for field in self.fields}
+
     def __getitem__(self, idx):
         output = {}
-        data = np.load(self.file_list[idx])
-        delta_vmap = torch.tensor(data['delta_vmap'], dtype=torch.float)
-        delta_vmap = torch.reshape(delta_vmap, (1, 64, 64))
-        output["delta_vmap"] = delta_vmap
+        data = self.read_fields(idx)
+        delta_vmap = torch.from_numpy(data['delta_vmap'])
+        dI = torch.from_numpy(data["dI"])
+        dmap = data['dmap']
+        nmap = torch.from_numpy(data['nmap'])
 
-        dI = torch.tensor(data["dI"], dtype=torch.float)
+        output["delta_vmap"] = delta_vmap.view(1, 64, 64)
         output["dI"] = dI
 
-        dmap = data['dmap']
         # for idx, row in enumerate(dmap):
         #     for jdx, pixel in enumerate(row):
         #         if pixel > 300:
         #             dmap[idx][jdx] = 0
 
-        dmap = torch.tensor(dmap, dtype=torch.float)
-        dmap = torch.reshape(dmap, (1, 64, 64))
-        nmap = torch.tensor(data['nmap'], dtype=torch.float)
+        dmap = torch.from_numpy(dmap).view(1, 64, 64)
         nmap = nmap.permute(2, 0, 1)
         combined_map = torch.cat((dmap, nmap), dim=0)
         # combined_map = dmap
@@ -67,22 +166,31 @@ class Data:
         self.image_size = 64
         self.batch_size = 16
         self.shuffle = True
-        self.num_workers = 2
+        self.num_workers = min(8, os.cpu_count() or 1)
         self.device = device
-        self.transform = transforms.Compose([
-            transforms.Resize((64, 64), antialias=True),
-            transforms.Normalize(mean=[0.5, 0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5, 0.5]),  # Add data normalization
-        ])
+        # page-locked host memory lets batches be copied to the gpu asynchronously
+        self.pin_memory = self.device.type == "cuda"
+        # number of batches loaded in advance by each worker
+        self.prefetch_factor = 4
+        # stack the npz samples into memory-mapped files once instead of decompressing them every epoch
+        self.use_cache = True
+        # samples are already 64 x 64, normalization is applied to whole batches in Training
+        self.transform = None
 
     def dataset_prep(self):
-        dataset = CustomImageDataset(path=self.dataroot, pattern=self.pattern, transform=self.transform)
+        if self.use_cache:
+            CustomImageDataset.prepare_cache(path=self.dataroot, pattern=self.pattern)
+        dataset = CustomImageDataset(path=self.dataroot, pattern=self.pattern, transform=self.transform,
+                                     use_cache=self.use_cache)
         train_size = int(0.8 * len(dataset))
         val_size = len(dataset) - train_size
         train_dataset, val_dataset = random_split(dataset, [train_size, val_size])
         train_dataloader = DataLoader(dataset=train_dataset, batch_size=self.batch_size, shuffle=self.shuffle,
-                                      num_workers=self.num_workers)
+                                      num_workers=self.num_workers, pin_memory=self.pin_memory,
+                                      persistent_workers=True, prefetch_factor=self.prefetch_factor)
         val_dataloader = DataLoader(dataset=val_dataset, batch_size=self.batch_size, shuffle=False,
-                                    num_workers=self.num_workers)
+                                    num_workers=self.num_workers, pin_memory=self.pin_memory,
+                                    persistent_workers=True, prefetch_factor=self.prefetch_factor)
         return train_dataloader, val_dataloader
 
 
@@ -107,8 +215,8 @@ class Training:
         self.dis_feature_map_size = 64
         # labels
         self.labels = {"real": 1.0, "fake": 0.0}
-        # loss function - binary cross entropy loss
-        self.criterion = nn.BCELoss()
+        # loss function - binary cross entropy loss on discriminator logits (autocast safe)
+        self.criterion = nn.BCEWithLogitsLoss()
         # loss function for VAE
         self.vae_criterion = nn.KLDivLoss(reduction="batchmean")
         # vae optmizer
@@ -133,35 +241,66 @@ class Training:
         self.n_epochs = n_epochs
         # device to run model
         self.device = device
+        # combined_map normalization, applied to each batch instead of per sample in the dataloader workers
+        self.map_mean = torch.tensor([0.5, 0.5, 0.5, 0.5], device=self.device).view(1, -1, 1, 1)
+        self.map_std = torch.tensor([0.5, 0.5, 0.5, 0.5], device=self.device).view(1, -1, 1, 1)
+        # shapes are static, so let cudnn benchmark and cache the fastest conv algorithm for each of them
+        cudnn.benchmark = True
+        # allow TF32 tensor core math for the fp32 convs and matmuls left outside autocast (Ampere and newer)
+        torch.backends.cuda.matmul.allow_tf32 = True
+        cudnn.allow_tf32 = True
+        # mixed precision training is only enabled on cuda devices
+        self.use_amp = self.device.type == "cuda"
+        # gradient scalers for discriminator and generator (+ vae encoder) losses
+        self.scaler_d = GradScaler(enabled=self.use_amp)
+        self.scaler_g = GradScaler(enabled=self.use_amp)
+        # compile the networks with torch.compile (PyTorch 2) when training on a cuda device
+        self.compile_models = hasattr(torch, "compile") and self.device.type == "cuda"
+        # number of background threads encoding and writing the saved comparison images
+        self.io_workers = 4
 
     # Suggested by DCGAN paper to initialize the initial generator image with random noises having mean = 0 and std =
     # 0.02
     def weight_initialization(self, gen):
-        class_name = gen.__class__.__name__
-        if class_name.find("Conv") != -1:
+        if isinstance(gen, nn.modules.conv._ConvNd):
             nn.init.normal_(gen.weight.data, 0.0, 0.02)
-        elif class_name.find("BatchNorm") != -1:
+        elif isinstance(gen, (nn.modules.batchnorm._BatchNorm, nn.GroupNorm)) and gen.affine:
             nn.init.normal_(gen.weight.data, 1.0, 0.02)
             nn.init.constant_(gen.bias.data, 0)
 
     def training(self):
         # initialize vae encoder
-        vae_encoder = VanillaVAEEncoder(in_channels=self.in_channels, latent_dim=self.latent_dims)
+        vae_encoder = VanillaVAEEncoder(in_channels=self.in_channels,
+                                        latent_dim=self.latent_dims).to(self.device, memory_format=torch.channels_last)
+        vae_encoder.apply(self.weight_initialization)
         # initialize generator
         generator = Generator(self.total_latent_dims, self.gen_feature_map_size,
-                              self.n_channels).to(device=self.device)
+                              self.n_channels).to(device=self.device, memory_format=torch.channels_last)
         generator.apply(self.weight_initialization)
         # initialize discriminator
-        discriminator = Discriminator(self.dis_feature_map_size, self.n_channels).to(self.device)
+        discriminator = Discriminator(self.dis_feature_map_size,
+                                      self.n_channels).to(self.device, memory_format=torch.channels_last)
         discriminator.apply(self.weight_initialization)
-
-        fixed_noise = torch.randn(64, self.total_latent_dims, 1, 1, device=self.device)
+        if self.compile_models:
+            vae_encoder = torch.compile(vae_encoder, mode="max-autotune")
+            generator = torch.compile(generator, mode="max-autotune")
+            discriminator = torch.compile(discriminator, mode="max-autotune")
+
+        # sample fixed_noise with a generator living on the training device, so it is drawn there directly
+        noise_generator = torch.Generator(device=self.device).manual_seed(self.manualSeed)
+        fixed_noise = torch.randn(64, self.total_latent_dims, 1, 1, device=self.device,
+                                  generator=noise_generator).contiguous(memory_format=torch.channels_last)
         criterion = self.criterion
         vae_criterion = self.vae_criterion
         vae_optimizer = self.vae_optimizer(vae_encoder.parameters(), lr=self.vae_lr, betas=self.betas)
         gen_optimizer = self.gen_optimizer(generator.parameters(), lr=self.gen_lr, betas=self.betas)
         dis_optimizer = self.dis_optimizer(discriminator.parameters(), lr=self.dis_lr, betas=self.betas)
         train_dataloader, val_dataloader = Data().dataset_prep()
+        # label tensors allocated once on the device, sized from the dataloaders that produce the batches and sliced
+        # to the size of each batch
+        label_size = max(train_dataloader.batch_size, val_dataloader.batch_size)
+        self.real_label = torch.full((label_size,), self.labels["real"], dtype=torch.float, device=self.device)
+        self.fake_label = torch.full((label_size,), self.labels["fake"], dtype=torch.float, device=self.device)
 
         # Lists to keep track of progress
         img_list = []
@@ -180,149 +319,167 @@ class Training:
                 shutil.rmtree(f_path)
             os.makedirs(f_path)
 
-        print("Starting Training Loop...")
-        # For each epoch
-        for epoch in range(self.n_epochs):
-            gen_loss, dis_loss, val_gen_loss, val_dis_loss, train_batches, val_batches = 0, 0, 0, 0, 0, 0
-            # For each batch in the dataloader
-            for mode in ["train", "val"]:
-                if mode == "train":
-                    loader = train_dataloader
-                else:
-                    loader = val_dataloader
-                    torch.no_grad()
-
-                for i, data in enumerate(loader, 0):
-
-                    ############################
-                    # (1) Update D network: maximize log(D(x)) + log(1 - D(G(z)))
-                    ###########################
-                    # Train with all-real batch
-                    discriminator.zero_grad()
-                    # Format batch
-                    real = data["delta_vmap"].to(device)
-                    b_size = real.size(0)
-                    label = torch.full((b_size,), self.labels["real"], dtype=torch.float, device=device)
-                    # Forward pass real batch through D
-                    output = discriminator(real).view(-1)
-                    # Calculate loss on all-real batch
-                    dis_error_real = criterion(output, label)
-                    if mode == "train":
-                        # Calculate gradients for D in backward pass
-                        dis_error_real.backward()
-                    D_x = output.mean().item()
-
-                    # Train with all-fake batch
-                    # Generate batch of latent vectors
-                    combined_map = data["combined_map"]
-                    vae_latent_embedding = vae_encoder.forward(combined_map).to(self.device)
-                    vae_latent_embedding = nn.functional.normalize(vae_latent_embedding)
-                    di = data["dI"].to(self.device)
-                    vae_latent_embedding_with_di = torch.cat((vae_latent_embedding, di), dim=1).to(self.device)
-                    vae_latent_embed_vector = torch.reshape(vae_latent_embedding_with_di,
-                                                            (b_size, self.total_latent_dims, 1, 1))
-
-                    # Generate fake image batch with G
-                    fake = generator(vae_latent_embed_vector)
-                    # labels for fake image batch
-                    label.fill_(self.labels["fake"])
-                    # Classify all fake batch with D
-                    output = discriminator(fake.detach()).view(-1)
-                    # Calculate D's loss on the all-fake batch
-                    dis_error_fake = criterion(output, label)
+        # image files are encoded and written off the training loop, the pool is shut down (waiting for pending
+        # writes) even if training raises
+        io_futures = []
+        with ThreadPoolExecutor(max_workers=self.io_workers) as io_pool:
+            print("Starting Training Loop...")
+            # For each epoch
+            for epoch in range(self.n_epochs):
+                gen_loss, dis_loss, val_gen_loss, val_dis_loss, train_batches, val_batches = 0, 0, 0, 0, 0, 0
+                # For each batch in the dataloader
+                for mode in ["train", "val"]:
                     if mode == "train":
-                        # Calculate the gradients for this batch, accumulated (summed) with previous gradients
-                        dis_error_fake.backward()
-                    D_G_z1 = output.mean().item()
-                    # Compute error of D as sum over the fake and the real batches
-                    dis_error = dis_error_real + dis_error_fake
-                    if mode == "train":
-                        # Update D
-                        dis_optimizer.step()
-
-                    ############################
-                    # (2) Update G network: maximize log(D(G(z)))
-                    ###########################
-                    generator.zero_grad()
-                    label.fill_(self.labels["real"])  # fake labels are real for generator cost
-                    # Since we just updated D, perform another forward pass of all-fake batch through D
-                    output = discriminator(fake).view(-1)
-                    # Calculate G's loss based on this output
-                    gen_error = criterion(output, label)
-                    # Update VAE Encoder to generate better latent vectors
-                    delta_vmaps = data["delta_vmap"].to(self.device)
-                    # vae error between fake and delta_maps
-                    softmax_fake = nn.functional.softmax(fake, dim=2)
-                    softmax_d_vmaps = nn.functional.softmax(delta_vmaps, dim=2)
-                    vae_error = vae_criterion(softmax_fake, softmax_d_vmaps)
-                    # total error
-                    total_error = gen_error + (- self.vae_loss_scaling_factor * vae_error)
-                    D_G_z2 = output.mean().item()
-                    if mode == "train":
-                        # Calculate gradients for G
-                        total_error.backward()
-                        # Update G
-                        gen_optimizer.step()
-                        # vae_error.backward(retain_graph=True)
-                        # Update VAE
-                        vae_optimizer.step()
-
-                    # Output training stats
-                    if i % 50 == 0:
-                        # Output training stats
-                        if i % 50 == 0:
-                            print(f"[{epoch}/{self.n_epochs}][{i}/{len(loader)}]\tVAE Loss: {vae_error.item():.4f}"
-                                  f"\tLoss_D: {dis_error.item():.4f} \tLoss_G: {gen_error.item():.4f}\tD(x): {D_x:.4f}"
-                                  f"\tD(G(z)): {D_G_z1:.4f} / {D_G_z2:.4f}")
+                        loader = train_dataloader
+                    else:
+                        loader = val_dataloader
+
+                    # autograd is only needed for the training pass
+                    with torch.set_grad_enabled(mode == "train"):
+                        for i, data in enumerate(loader, 0):
+
+                            ############################
+                            # (1) Update D network: maximize log(D(x)) + log(1 - D(G(z)))
+                            ###########################
+                            # Train with all-real batch
+                            discriminator.zero_grad(set_to_none=True)
+                            # Format batch
+                            real = data["delta_vmap"].to(device, memory_format=torch.channels_last, non_blocking=True)
+                            b_size = real.size(0)
+                            real_label = self.real_label[:b_size]
+                            fake_label = self.fake_label[:b_size]
+                            with autocast(enabled=self.use_amp, dtype=torch.float16):
+                                # Forward pass real batch through D
+                                output = discriminator(real).view(-1)
+                                # Calculate loss on all-real batch
+                                dis_error_real = criterion(output, real_label)
+                            if mode == "train":
+                                # Calculate gradients for D in backward pass
+                                self.scaler_d.scale(dis_error_real).backward()
+                            D_x = torch.sigmoid(output).mean().detach()
+
+                            # Train with all-fake batch
+                            with autocast(enabled=self.use_amp, dtype=torch.float16):
+                                # Generate batch of latent vectors
+                                combined_map = data["combined_map"].to(self.device, memory_format=torch.channels_last,
+                                                                       non_blocking=True)
+                                combined_map = combined_map.sub_(self.map_mean).div_(self.map_std)
+                                vae_latent_embedding = vae_encoder(combined_map)
+                                vae_latent_embedding = nn.functional.normalize(vae_latent_embedding)
+                                di = data["dI"].to(self.device, non_blocking=True)
+                                vae_latent_embedding_with_di = torch.cat((vae_latent_embedding, di), dim=1)
+                                vae_latent_embed_vector = torch.reshape(vae_latent_embedding_with_di,
+                                                                        (b_size, self.total_latent_dims, 1, 1))
+                                vae_latent_embed_vector = vae_latent_embed_vector.contiguous(memory_format=torch.channels_last)
+
+                                # Generate fake image batch with G
+                                fake = generator(vae_latent_embed_vector)
+                                # Classify all fake batch with D
+                                output = discriminator(fake.detach()).view(-1)
+                                # Calculate D's loss on the all-fake batch
+                                dis_error_fake = criterion(output, fake_label)
+                            if mode == "train":
+                                # Calculate the gradients for this batch, accumulated (summed) with previous gradients
+                                self.scaler_d.scale(dis_error_fake).backward()
+                            D_G_z1 = torch.sigmoid(output).mean().detach()
+                            # Compute error of D as sum over the fake and the real batches
+                            dis_error = dis_error_real + dis_error_fake
+                            if mode == "train":
+                                # Update D
+                                self.scaler_d.step(dis_optimizer)
+                                self.scaler_d.update()
+
+                            ############################
+                            # (2) Update G network: maximize log(D(G(z)))
+                            ###########################
+                            generator.zero_grad(set_to_none=True)
+                            vae_encoder.zero_grad(set_to_none=True)
+                            with autocast(enabled=self.use_amp, dtype=torch.float16):
+                                if mode == "train":
+                                    # Since we just updated D, perform another forward pass of all-fake batch through D
+                                    output = discriminator(fake).view(-1)
+                                # D is not updated during validation, so its output on the fake batch above is reused
+                                # Calculate G's loss based on this output
+                                # fake labels are real for generator cost
+                                gen_error = criterion(output, real_label)
+                                # Update VAE Encoder to generate better latent vectors
+                                # vae error between fake and delta_maps (real), KLDivLoss expects log-probabilities as input
+                                log_softmax_fake = nn.functional.log_softmax(fake, dim=2)
+                                softmax_d_vmaps = nn.functional.softmax(real, dim=2)
+                                vae_error = vae_criterion(log_softmax_fake, softmax_d_vmaps)
+                                # total error
+                                total_error = gen_error + (- self.vae_loss_scaling_factor * vae_error)
+                            D_G_z2 = torch.sigmoid(output).mean().detach()
+                            if mode == "train":
+                                # Calculate gradients for G (and the VAE encoder through the latent embedding)
+                                self.scaler_g.scale(total_error).backward()
+                                # Update G
+                                self.scaler_g.step(gen_optimizer)
+                                # vae_error.backward(retain_graph=True)
+                                # Update VAE
+                                self.scaler_g.step(vae_optimizer)
+                                self.scaler_g.update()
+
+                            # Output training stats, the only place the per batch values are read back to the host
+                            if i % 50 == 0:
+                                print(f"[{epoch}/{self.n_epochs}][{i}/{len(loader)}]\tVAE Loss: {vae_error.item():.4f}"
+                                      f"\tLoss_D: {dis_error.item():.4f} \tLoss_G: {gen_error.item():.4f}\tD(x): {D_x.item():.4f}"
+                                      f"\tD(G(z)): {D_G_z1.item():.4f} / {D_G_z2.item():.4f}")
+
+                            if mode == "train":
+                                gen_loss += gen_error.detach()
+                                dis_loss += dis_error.detach()
+                                train_batches += 1
+
+                                # save fake images generated from the embedding vector to compare with corresponding real images
+                                if epoch == self.n_epochs - 1:
+                                    # one device to host copy and one grid image per batch (generated row above the
+                                    # real row), encoded on the io pool
+                                    gen_real = torch.cat((fake.detach(), real), dim=0).float().cpu()
+                                    io_futures.append(io_pool.submit(
+                                        vutils.save_image, tensor=gen_real, nrow=len(fake), normalize=True,
+                                        fp=os.path.join(train_imgs_path, f"{train_iters:04d}_gen_real.jpg")))
+                                    train_iters += 1
+
+                                # Check how the generator is doing by saving G's output on fixed_noise
+                                if (iters % 500 == 0) or ((epoch == self.n_epochs - 1) and (i == len(train_dataloader) - 1)):
+                                    with torch.no_grad():
+                                        fake = generator(fixed_noise).detach().cpu()
+                                    img_list.append(vutils.make_grid(fake, padding=2, normalize=True))
+                            else:
+                                val_gen_loss += gen_error.detach()
+                                val_dis_loss += dis_error.detach()
+                                val_batches += 1
+
+                                # save fake images generated from the embedding vector to compare with corresponding real images
+                                if epoch == self.n_epochs - 1:
+                                    # one device to host copy and one grid image per batch (generated row above the
+                                    # real row), encoded on the io pool
+                                    gen_real = torch.cat((fake.detach(), real), dim=0).float().cpu()
+                                    io_futures.append(io_pool.submit(
+                                        vutils.save_image, tensor=gen_real, nrow=len(fake), normalize=True,
+                                        fp=os.path.join(val_imgs_path, f"{val_iters:04d}_gen_real.jpg")))
+                                    val_iters += 1
+
+                                # Check how the generator is doing by saving G's output on fixed_noise
+                                if (iters % 500 == 0) or ((epoch == self.n_epochs - 1) and (i == len(loader) - 1)):
+                                    fake = generator(fixed_noise).detach().cpu()
+                                    val_img_list.append(vutils.make_grid(fake, padding=2, normalize=True))
+
+                            iters += 1
 
                     if mode == "train":
-                        gen_loss += gen_error.item()
-                        dis_loss += dis_error.item()
-                        train_batches += 1
-
-                        # save fake images generated from the embedding vector to compare with corresponding real images
-                        if epoch == self.n_epochs - 1:
-                            for i in range(len(fake)):
-                                torchvision.utils.save_image(tensor=fake[i, :, :, :],
-                                                             fp=os.path.join(train_imgs_path, f"{train_iters*self.batch_size + i:03d}_gen.jpg"))
-                                torchvision.utils.save_image(tensor=real[i, :, :, :],
-                                                             fp=os.path.join(train_imgs_path, f"{train_iters*self.batch_size + i:03d}_real.jpg"))
-                            train_iters += 1
-
-                        # Check how the generator is doing by saving G's output on fixed_noise
-                        if (iters % 500 == 0) or ((epoch == self.n_epochs - 1) and (i == len(train_dataloader) - 1)):
-                            with torch.no_grad():
-                                fake = generator(fixed_noise).detach().cpu()
-                            img_list.append(vutils.make_grid(fake, padding=2, normalize=True))
+                        # Save Losses for plotting later, losses are accumulated on the device and read back once per epoch
+                        gen_losses.append(float(gen_loss)/train_batches)
+                        dis_losses.append(float(dis_loss)/train_batches)
                     else:
-                        val_gen_loss += gen_error.item()
-                        val_dis_loss += dis_error.item()
-                        val_batches += 1
-
-                        # save fake images generated from the embedding vector to compare with corresponding real images
-                        if epoch == self.n_epochs - 1:
-                            for i in range(len(fake)):
-                                torchvision.utils.save_image(tensor=fake[i, :, :, :],
-                                                             fp=os.path.join(val_imgs_path, f"{val_iters*self.batch_size + i:03d}_gen.jpg"))
-                                torchvision.utils.save_image(tensor=real[i, :, :, :],
-                                                             fp=os.path.join(val_imgs_path, f"{val_iters*self.batch_size + i:03d}_real.jpg"))
-                            val_iters += 1
-
-                        # Check how the generator is doing by saving G's output on fixed_noise
-                        if (iters % 500 == 0) or ((epoch == self.n_epochs - 1) and (i == len(loader) - 1)):
-                            fake = generator(fixed_noise).detach().cpu()
-                            val_img_list.append(vutils.make_grid(fake, padding=2, normalize=True))
-
-                    iters += 1
-
-                if mode == "train":
-                    # Save Losses for plotting later
-                    gen_losses.append(gen_loss/train_batches)
-                    dis_losses.append(dis_loss/train_batches)
-                else:
-                    # Save Losses for plotting later
-                    val_gen_losses.append(val_gen_loss/val_batches)
-                    val_dis_losses.append(val_dis_loss/val_batches)
+                        # Save Losses for plotting later
+                        val_gen_losses.append(float(val_gen_loss)/val_batches)
+                        val_dis_losses.append(float(val_dis_loss)/val_batches)
+
+        # re-raise any error from the image writes
+        for future in io_futures:
+            future.result()
 
         return img_list, val_img_list, gen_losses, dis_losses, val_gen_losses, val_dis_losses
 
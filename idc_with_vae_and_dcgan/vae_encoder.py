@@ -35,8 +35,8 @@ class VanillaVAEEncoder(nn.Module):
         return encoder
 
     def calculate_mu_var(self, result, result_dim):
-        fc_mu = nn.Linear(result_dim, self.latent_dim)
-        fc_var = nn.Linear(result_dim, self.latent_dim)
+        fc_mu = nn.Linear(result_dim, self.latent_dim, device=result.device)
+        fc_var = nn.Linear(result_dim, self.latent_dim, device=result.device)
         return fc_mu(result), fc_var(result)
 
     def encode(self, input: torch.tensor) -> list[torch.tensor]: